@@ -2,6 +2,8 @@ import argparse
 
 from modules.game_state import GameState
 from modules.game_visualization import GameVisualization
+from modules.optimizer import SolutionOptimizer
+from modules.replay import SolutionReplay
 from modules.solver import Solver
 
 
@@ -20,6 +22,8 @@ if __name__ == '__main__':
     parser.add_argument('--map', help='The map file', default='maps/demo.txt')
     parser.add_argument(
         '--strategy', help='The strategy to solve the game', default='bfs')
+    parser.add_argument(
+        '--optimize', help='Time budget in seconds to shorten the solution (0 to disable)', type=float, default=0)
     args = parser.parse_args()
 
     map = load_map(args.map)
@@ -31,5 +35,17 @@ if __name__ == '__main__':
     solution = solver.get_solution()
     print("Time: ", solver.time)
 
+    if solution is not None:
+        result = SolutionReplay(game_state).run(solution)
+        print("Valid solution: ", result.is_valid())
+        print("Moves: ", result.moves, "Pushes: ", result.pushes)
+
+    if solution is not None and args.optimize > 0:
+        optimizer = SolutionOptimizer(game_state, args.optimize)
+        solution = optimizer.optimize(solution)
+        print("Optimization time: ", optimizer.time)
+        print("Moves: ", optimizer.before.moves, "->", optimizer.after.moves)
+        print("Pushes: ", optimizer.before.pushes, "->", optimizer.after.pushes)
+
     game_visualization = GameVisualization(game_state, solution)
     game_visualization.start()
@@ -0,0 +1,248 @@
+# Solution post-optimizer for sokuban game
+# The optimizer takes any valid solution and shortens it within a time budget:
+# - the player walks between pushes are replaced by shortest paths
+# - sliding windows of the push sequence are re-searched with a bounded local search
+#   (uniform-cost search over pushes, costed in moves then pushes)
+# Positions are cell indices of the flat board compiled by SolutionReplay.
+# The optimizer class has the following methods:
+# - optimize(solution): return the shortened solution
+#
+# Path: modules/optimizer.py
+
+import time
+from collections import deque
+from heapq import heappush, heappop
+from modules.replay import SolutionReplay
+
+
+class SolutionOptimizer(object):
+    def __init__(self, initial_state, time_limit=1.0, window=8, max_nodes=20000):
+        self.replay = SolutionReplay(initial_state)
+        self.time_limit = time_limit
+        self.window = window
+        self.max_nodes = max_nodes
+        self.directions = list(self.replay.offsets.items())
+        self.step_direction = dict((step, direction) for direction, step in self.directions)
+        self.targets = frozenset(i for i in range(len(self.replay.targets)) if self.replay.targets[i])
+        self.live = self.find_live_cells()
+        self.before = None
+        self.after = None
+        self.time = None
+
+    def optimize(self, solution):
+        """Shorten the solution within the time budget
+            The solution is returned unchanged if it is not valid.
+            The move and push counts before and after are kept in self.before and self.after.
+        """
+        start_time = time.time()
+        deadline = start_time + self.time_limit
+        self.before = self.replay.run(solution)
+        if not self.before.is_valid():
+            self.after = self.before
+            self.time = time.time() - start_time
+            return solution
+
+        pushes = self.extract_pushes(solution)
+        moves, ends = self.walk(pushes)
+
+        improved = True
+        while improved and time.time() < deadline:
+            improved = False
+            states = self.push_states(pushes)
+            i = 0
+            while i < len(pushes) and time.time() < deadline:
+                j = min(i + self.window, len(pushes))
+                cost = ends[j - 1] - (ends[i - 1] if i > 0 else 0)
+                window = self.search_window(states[i], states[j], j == len(pushes), (cost, j - i), deadline)
+                if window is not None:
+                    candidate = pushes[:i] + window + pushes[j:]
+                    walked = self.walk(candidate)
+                    if walked is not None and (len(walked[0]), len(candidate)) < (len(moves), len(pushes)):
+                        pushes = candidate
+                        moves, ends = walked
+                        states = self.push_states(pushes)
+                        improved = True
+                i += max(1, self.window // 2)
+
+        self.after = self.replay.run(moves)
+        if not self.after.is_valid() or (self.after.moves, self.after.pushes) > (self.before.moves, self.before.pushes):
+            moves = list(solution)
+            self.after = self.before
+        self.time = time.time() - start_time
+        return moves
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods convert between move sequences and push sequences
+    # A push is a tuple (box cell before the push, direction)
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def extract_pushes(self, solution):
+        """Get the push sequence of a valid solution"""
+        offsets = self.replay.offsets
+        boxes = set(i for i in range(len(self.replay.boxes)) if self.replay.boxes[i])
+        player = self.replay.player
+        pushes = []
+        for direction in solution:
+            step = offsets[direction]
+            player += step
+            if player in boxes:
+                boxes.remove(player)
+                boxes.add(player + step)
+                pushes.append((player, direction))
+        return pushes
+
+    def push_states(self, pushes):
+        """Get the (boxes, player) state before every push, and the state after the last push"""
+        offsets = self.replay.offsets
+        boxes = frozenset(i for i in range(len(self.replay.boxes)) if self.replay.boxes[i])
+        player = self.replay.player
+        states = [(boxes, player)]
+        for box, direction in pushes:
+            boxes = boxes.difference((box,)).union((box + offsets[direction],))
+            player = box
+            states.append((boxes, player))
+        return states
+
+    def walk(self, pushes):
+        """Build the move sequence of a push sequence using shortest player walks between pushes
+            Return (moves, ends) where ends[k] is the number of moves after push k,
+            or None if a push cannot be reached.
+        """
+        offsets = self.replay.offsets
+        boxes = set(i for i in range(len(self.replay.boxes)) if self.replay.boxes[i])
+        player = self.replay.player
+        moves = []
+        ends = []
+        for box, direction in pushes:
+            step = offsets[direction]
+            path = self.shortest_path(player, box - step, boxes)
+            if path is None or box not in boxes or box + step in boxes or self.replay.walls[box + step]:
+                return None
+            moves.extend(path)
+            moves.append(direction)
+            ends.append(len(moves))
+            boxes.remove(box)
+            boxes.add(box + step)
+            player = box
+        return moves, ends
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # The following methods search the board
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def find_live_cells(self):
+        """Find the cells from which a box can still be pushed to some target
+            Note: computed by pulling boxes backwards from every target
+        """
+        walls = self.replay.walls
+        live = bytearray(len(walls))
+        queue = deque(self.targets)
+        for target in self.targets:
+            live[target] = 1
+        while queue:
+            cell = queue.popleft()
+            for _, step in self.directions:
+                previous = cell - step
+                if not live[previous] and not walls[previous] and not walls[previous - step]:
+                    live[previous] = 1
+                    queue.append(previous)
+        return live
+
+    def distances(self, player, boxes):
+        """Get the walking distance from the player to every cell, -1 if the cell is unreachable"""
+        walls = self.replay.walls
+        distances = [-1] * len(walls)
+        distances[player] = 0
+        queue = deque([player])
+        while queue:
+            cell = queue.popleft()
+            distance = distances[cell] + 1
+            for _, step in self.directions:
+                next_cell = cell + step
+                if distances[next_cell] < 0 and not walls[next_cell] and next_cell not in boxes:
+                    distances[next_cell] = distance
+                    queue.append(next_cell)
+        return distances
+
+    def shortest_path(self, start, goal, boxes):
+        """Get the shortest list of directions that walks the player from start to goal without pushing"""
+        if start == goal:
+            return []
+        walls = self.replay.walls
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for _, step in self.directions:
+                next_cell = cell + step
+                if next_cell in parents or walls[next_cell] or next_cell in boxes:
+                    continue
+                parents[next_cell] = cell
+                if next_cell == goal:
+                    path = []
+                    while parents[next_cell] is not None:
+                        path.append(self.step_direction[next_cell - parents[next_cell]])
+                        next_cell = parents[next_cell]
+                    path.reverse()
+                    return path
+                queue.append(next_cell)
+        return None
+
+    def search_window(self, start, goal, final, bound, deadline):
+        """Search for a push sequence from the start state to the goal state costing less than bound
+            The cost is (moves, pushes), the moves include the walk to the goal player position.
+            When final is True any solved state is a goal.
+            Return the list of pushes, or None if nothing cheaper is found within the node and time limits.
+        """
+        walls = self.replay.walls
+        live = self.live
+        goal_boxes, goal_player = goal
+        start_key = start
+        best = {start_key: (0, 0)}
+        parents = {start_key: None}
+        counter = 0
+        heap = [(0, 0, counter, start_key, False)]
+        nodes = 0
+
+        while heap:
+            moves, pushes, _, key, is_goal = heappop(heap)
+            if (moves, pushes) >= bound:
+                return None
+            if is_goal:
+                path = []
+                while parents[key] is not None:
+                    key, push = parents[key]
+                    path.append(push)
+                path.reverse()
+                return path
+            if best[key] < (moves, pushes):
+                continue
+            nodes += 1
+            if nodes > self.max_nodes or (nodes % 256 == 0 and time.time() > deadline):
+                return None
+
+            boxes, player = key
+            distances = self.distances(player, boxes)
+            if final:
+                if boxes <= self.targets:
+                    counter += 1
+                    heappush(heap, (moves, pushes, counter, key, True))
+            elif boxes == goal_boxes and distances[goal_player] >= 0:
+                counter += 1
+                heappush(heap, (moves + distances[goal_player], pushes, counter, key, True))
+
+            for box in boxes:
+                for direction, step in self.directions:
+                    distance = distances[box - step]
+                    beyond = box + step
+                    if distance < 0 or walls[beyond] or not live[beyond] or beyond in boxes:
+                        continue
+                    next_key = (boxes.difference((box,)).union((beyond,)), box)
+                    cost = (moves + distance + 1, pushes + 1)
+                    if cost >= bound or best.get(next_key, bound) <= cost:
+                        continue
+                    best[next_key] = cost
+                    parents[next_key] = (key, (box, direction))
+                    counter += 1
+                    heappush(heap, (cost[0], cost[1], counter, next_key, False))
+        return None
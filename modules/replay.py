@@ -0,0 +1,113 @@
+# Fast solution replay and verification for sokuban game
+# The replay engine compiles the map of a game state once into a compact flat board
+# (one cell index per square, surrounded by a wall border) and applies a sequence of
+# moves in place, without building intermediate game states.
+# The replay class has the following methods:
+# - run(solution): replay the solution and return a ReplayResult
+# - verify(solution): check that the solution is legal and solves the game
+#
+# Path: modules/replay.py
+
+
+class ReplayResult(object):
+    """Outcome of replaying a solution
+        - legal: every move of the solution could be applied
+        - solved: all the boxes are on targets after the last applied move
+        - moves: number of moves applied (pushes included)
+        - pushes: number of moves that pushed a box
+        - error_index: index of the first illegal move, None if all moves are legal
+    """
+
+    def __init__(self, legal, solved, moves, pushes, error_index=None):
+        self.legal = legal
+        self.solved = solved
+        self.moves = moves
+        self.pushes = pushes
+        self.error_index = error_index
+
+    def is_valid(self):
+        """Check if the solution is legal and ends in a solved state"""
+        return self.legal and self.solved
+
+    def __repr__(self):
+        return 'ReplayResult(legal=%s, solved=%s, moves=%d, pushes=%d, error_index=%s)' % (
+            self.legal, self.solved, self.moves, self.pushes, self.error_index)
+
+
+class SolutionReplay(object):
+    def __init__(self, initial_state):
+        self.initial_state = initial_state
+        # The board is padded with one wall on every side so moves never leave the board
+        self.width = max(len(row) for row in initial_state.map) + 2
+        self.height = initial_state.height + 2
+        size = self.width * self.height
+
+        self.walls = bytearray(b'\x01') * size
+        self.targets = bytearray(size)
+        self.boxes = bytearray(size)
+        self.player = None
+        for row, line in enumerate(initial_state.map):
+            for column, cell in enumerate(line):
+                index = self.index((row, column))
+                if cell != '#':
+                    self.walls[index] = 0
+                if cell in ('.', '*', '+'):
+                    self.targets[index] = 1
+                if cell in ('$', '*'):
+                    self.boxes[index] = 1
+                if cell in ('@', '+'):
+                    self.player = index
+
+        self.box_count = sum(self.boxes)
+        self.boxes_on_target = sum(1 for i in range(size) if self.boxes[i] and self.targets[i])
+        self.offsets = {'U': -self.width, 'D': self.width, 'L': -1, 'R': 1}
+
+    def index(self, position):
+        """Convert a (row, column) position of the map into an index of the flat board"""
+        row, column = position
+        return (row + 1) * self.width + column + 1
+
+    def position(self, index):
+        """Convert an index of the flat board into a (row, column) position of the map"""
+        return (index // self.width - 1, index % self.width - 1)
+
+    def run(self, solution):
+        """Replay the solution from the initial state and return a ReplayResult
+            The solution is any sequence of directions ('U', 'D', 'L', 'R'), e.g. a list or a string.
+            The replay stops at the first illegal move:
+            - an unknown direction
+            - moving into a wall
+            - pushing a box into a wall or into another box
+        """
+        walls = self.walls
+        targets = self.targets
+        boxes = self.boxes[:]
+        offsets = self.offsets
+        player = self.player
+        on_target = self.boxes_on_target
+        pushes = 0
+
+        for i, direction in enumerate(solution):
+            step = offsets.get(direction)
+            if step is None:
+                return ReplayResult(False, on_target == self.box_count, i, pushes, i)
+            next_cell = player + step
+            if walls[next_cell]:
+                return ReplayResult(False, on_target == self.box_count, i, pushes, i)
+            if boxes[next_cell]:
+                beyond = next_cell + step
+                if walls[beyond] or boxes[beyond]:
+                    return ReplayResult(False, on_target == self.box_count, i, pushes, i)
+                boxes[next_cell] = 0
+                boxes[beyond] = 1
+                on_target += targets[beyond] - targets[next_cell]
+                pushes += 1
+            player = next_cell
+
+        return ReplayResult(True, on_target == self.box_count, len(solution), pushes)
+
+    def verify(self, solution):
+        """Check if the solution is legal and solves the game"""
+        if solution is None:
+            return False
+        return self.run(solution).is_valid()